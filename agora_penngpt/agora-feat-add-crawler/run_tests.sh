@@ -0,0 +1,2 @@
+source venv/bin/activate
+pytest src/backend/ai_test_crawler.py
@@ -0,0 +1,624 @@
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from protego import Protego
+
+import crawler
+
+
+@pytest.fixture(autouse=True)
+def clear_robots_cache():
+    crawler._ROBOTS_CACHE.clear()
+    crawler._HOST_NEXT_ALLOWED.clear()
+
+
+def test_is_sub_path():
+    parent = "https://example.com/path"
+
+    # Same path
+    assert crawler.is_sub_path("https://example.com/path", parent) is True
+    # Subpath
+    assert crawler.is_sub_path("https://example.com/path/sub", parent) is True
+    # Not a subpath (different path)
+    assert crawler.is_sub_path("https://example.com/other", parent) is False
+    # Different domain
+    assert crawler.is_sub_path("https://other.com/path", parent) is False
+    # Non-page files under the path
+    assert crawler.is_sub_path("https://example.com/path/file.pdf", parent) is False
+    # Malformed link
+    assert crawler.is_sub_path("http://[::1", parent) is False
+    # Edge case: subpath without trailing slash
+    assert crawler.is_sub_path("https://example.com/pathsub", parent) is False
+    # Trailing slash on parent and link
+    assert (
+        crawler.is_sub_path("https://example.com/path/", "https://example.com/path/")
+        is True
+    )
+
+
+def test_get_parent_key():
+    key = crawler.get_parent_key("https://example.com/path/")
+
+    assert key == crawler.ParentKey(
+        "https", "example.com", "https://example.com", "/path", "/path/"
+    )
+
+
+def test_canonicalize_url():
+    assert (
+        crawler.canonicalize_url("HTTPS://Example.com/path/?b=2&a=1#section")
+        == "https://example.com/path?a=1&b=2"
+    )
+    assert crawler.canonicalize_url("https://example.com/") == crawler.canonicalize_url(
+        "https://example.com"
+    )
+
+
+def test_get_children():
+    parent_url = "https://example.com"
+
+    hrefs = [
+        "https://example.com/path1",
+        "/path2",
+        "https://other.com/path3",
+        None,  # Link without href
+        "http://[::1",  # Malformed link
+    ]
+
+    children = crawler.get_children(hrefs, parent_url)
+    # Should include only links that are subpaths of parent_url
+    assert "https://example.com/path1" in children
+    assert "https://example.com/path2" in children
+    assert all(link.startswith(parent_url) for link in children)
+
+
+def test_get_children_resolves_against_parent_origin():
+    parent_url = "https://example.com/docs"
+
+    hrefs = [
+        "/docs/intro",
+        "/blog/post",
+        "//example.com/docs/faq",
+        "//cdn.com/docs",
+        "/docs/manual.PDF",
+        "/docs/report.docx",
+    ]
+
+    children = crawler.get_children(hrefs, parent_url)
+    assert children == [
+        "https://example.com/docs/intro",
+        "https://example.com/docs/faq",
+    ]
+
+
+def test_get_children_dedupes_in_page_order():
+    parent_url = "https://example.com"
+
+    hrefs = ["/b", "/a", "https://example.com/b", "/a", "/c"]
+
+    children = crawler.get_children(hrefs, parent_url)
+    assert children == [
+        "https://example.com/b",
+        "https://example.com/a",
+        "https://example.com/c",
+    ]
+
+
+def test_parse_result():
+    parent_url = "https://example.com"
+
+    html = """
+    <html><head><title>Test Page</title></head>
+    <body><a name="top"></a><a href="/child1">Child1</a><p>Hello World</p>
+    <script>var tracking = true;</script><style>p { color: red; }</style></body></html>
+    """
+
+    title, children, content = crawler.parse_result(html, parent_url)
+    assert title == "Test Page"
+    assert children == ["https://example.com/child1"]
+    assert "Hello World" in content
+    assert "tracking" not in content
+    assert "color" not in content
+
+
+def test_parse_result_collapses_whitespace():
+    html = "<html><body><h1>Title</h1>\n\n  <p>Hello\n\t World</p>  </body></html>"
+
+    _, _, content = crawler.parse_result(html, "https://example.com")
+    assert content == "Title Hello World"
+
+
+def test_parse_result_without_content():
+    html = "<html><head><title>Test Page</title></head><body><p>Hi</p></body></html>"
+
+    title, children, content = crawler.parse_result(
+        html, "https://example.com", include_content=False
+    )
+    assert title == "Test Page"
+    assert content is None
+
+
+def test_parse_result_decodes_declared_encoding():
+    html = "<html><head><title>Caf\u00e9</title></head><body></body></html>"
+
+    title, _, _ = crawler.parse_result(
+        html.encode("latin-1"), "https://example.com", "latin-1"
+    )
+    assert title == "Caf\u00e9"
+
+    title, _, _ = crawler.parse_result(html.encode(), "https://example.com", "utf-8")
+    assert title == "Caf\u00e9"
+
+
+@patch("crawler._CLIENT.get")
+def test_read_robots_txt_cached_per_host(mock_get):
+    mock_response = MagicMock(status_code=200)
+    mock_response.text = "User-agent: *\nDisallow: /private\nCrawl-delay: 2"
+    mock_get.return_value = mock_response
+
+    first = crawler.read_robots_txt("https://example.com/public")
+    second = crawler.read_robots_txt("https://example.com/private/page")
+
+    assert first == (2, None, None, True)
+    assert second == (2, None, None, False)
+    mock_get.assert_called_once_with("https://example.com/robots.txt")
+    # Host-level rules are computed once; only can_fetch runs per URL
+    assert list(crawler._ROBOTS_CACHE) == [("https", "example.com", "*")]
+
+
+@patch("crawler._CLIENT.get")
+def test_read_robots_txt_retries_transient_failures(mock_get):
+    robots_url = "https://example.com/robots.txt"
+    mock_get.side_effect = [
+        httpx.ConnectError("down"),
+        httpx.Response(503, request=httpx.Request("GET", robots_url)),
+        MagicMock(status_code=200, text="User-agent: *\nDisallow: /private"),
+    ]
+
+    # Failed lookups let the page through but are not cached
+    no_rules = (None, None, None, None)
+    assert crawler.read_robots_txt("https://example.com/private") == no_rules
+    assert crawler.read_robots_txt("https://example.com/private") == no_rules
+    assert crawler.read_robots_txt("https://example.com/private")[3] is False
+    assert crawler.read_robots_txt("https://example.com/private")[3] is False
+    assert mock_get.call_count == 3
+
+
+@patch("crawler._CLIENT.get")
+def test_read_robots_txt_caches_missing_robots(mock_get):
+    mock_get.return_value = MagicMock(status_code=404)
+
+    assert crawler.read_robots_txt("https://example.com/a") == (None, None, None, None)
+    assert crawler.read_robots_txt("https://example.com/b") == (None, None, None, None)
+    mock_get.assert_called_once_with("https://example.com/robots.txt")
+
+
+@patch("crawler.time.time")
+@patch("crawler._CLIENT.get")
+def test_read_robots_txt_refetched_after_ttl(mock_get, mock_time):
+    mock_response = MagicMock(status_code=200)
+    mock_response.text = "User-agent: *\nDisallow: /private"
+    mock_get.return_value = mock_response
+
+    # The TTL runs from when robots.txt was fetched, not from fixed windows
+    fetched_at = crawler.ROBOTS_CACHE_TTL / 2
+    mock_time.return_value = fetched_at
+    crawler.read_robots_txt("https://example.com/public")
+    mock_time.return_value = fetched_at + crawler.ROBOTS_CACHE_TTL - 1
+    crawler.read_robots_txt("https://example.com/public")
+    assert mock_get.call_count == 1
+
+    mock_time.return_value = fetched_at + crawler.ROBOTS_CACHE_TTL
+    crawler.read_robots_txt("https://example.com/public")
+    assert mock_get.call_count == 2
+
+
+@patch("crawler.ROBOTS_CACHE_SIZE", 2)
+@patch("crawler._CLIENT.get", return_value=MagicMock(status_code=404))
+def test_robots_cache_evicts_least_recently_used(mock_get):
+    crawler.read_robots_txt("https://a.com/")
+    crawler.read_robots_txt("https://b.com/")
+    crawler.read_robots_txt("https://a.com/")
+    crawler.read_robots_txt("https://c.com/")
+
+    assert list(crawler._ROBOTS_CACHE) == [
+        ("https", "a.com", "*"),
+        ("https", "c.com", "*"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "url,expected",
+    [
+        ("https://valid.url", True),
+        ("invalid-url", False),
+        ("ftp://example.com", True),  # any scheme is accepted
+        ("http://", False),
+        ("", False),
+        ("https://example.com/path?q=1#top", True),
+        ("https://exa mple.com", False),
+        ("http://example.com:port/", False),
+        ("http://[::1", False),
+        ("https://example.com\n", False),
+        ("http://[::1]:8080/", True),
+    ],
+)
+def test_validate_url(url, expected):
+    assert crawler.validate_url(url) == expected
+
+
+def make_response(status_code=200, chunks=(), headers=None):
+    # Stand-in for a streamed httpx response
+    mock_response = MagicMock()
+    mock_response.status_code = status_code
+    mock_response.headers = headers or {}
+    mock_response.encoding = "utf-8"
+    mock_response.iter_bytes.return_value = list(chunks)
+
+    async def aiter_bytes():
+        for chunk in chunks:
+            yield chunk
+
+    mock_response.aiter_bytes = aiter_bytes
+    return mock_response
+
+
+@patch("crawler._CLIENT.stream")
+def test_fetch_success(mock_stream):
+    mock_stream.return_value.__enter__.return_value = make_response(
+        chunks=[b"con", b"tent"]
+    )
+
+    status, content, encoding = crawler.fetch("https://example.com")
+    assert status == crawler.GOOD_STATUS
+    assert content == b"content"
+    assert encoding == "utf-8"
+    mock_stream.assert_called_once_with("GET", "https://example.com")
+
+
+@patch("crawler._CLIENT.stream")
+def test_fetch_failure_status_code(mock_stream):
+    mock_stream.return_value.__enter__.return_value = make_response(404)
+
+    status, content, encoding = crawler.fetch("https://example.com")
+    assert status == crawler.FAILED_STATUS
+    assert content == b""
+    assert encoding is None
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {},
+        {"content-type": "text/html; charset=utf-8"},
+        {"content-type": "application/xhtml+xml"},
+    ],
+)
+@patch("crawler._CLIENT.stream")
+def test_fetch_accepts_html(mock_stream, headers):
+    mock_stream.return_value.__enter__.return_value = make_response(
+        chunks=[b"<p>Hi</p>"], headers=headers
+    )
+
+    status, content, _ = crawler.fetch("https://example.com")
+    assert status == crawler.GOOD_STATUS
+    assert content == b"<p>Hi</p>"
+
+
+@patch("crawler.MAX_PAGE_SIZE", 4)
+@patch("crawler._CLIENT.stream")
+def test_fetch_too_large(mock_stream):
+    # Declared too large, the body is never read
+    declared = make_response(chunks=[b"content"], headers={"content-length": "7"})
+    # Undeclared, reading stops once the cap is passed
+    undeclared = make_response(chunks=[b"con", b"tent", b"more"])
+    mock_stream.return_value.__enter__.side_effect = [declared, undeclared]
+
+    assert crawler.fetch("https://example.com") == (crawler.FAILED_STATUS, b"", None)
+    declared.iter_bytes.assert_not_called()
+
+    assert crawler.fetch("https://example.com") == (crawler.FAILED_STATUS, b"", None)
+
+
+@pytest.mark.parametrize(
+    "content_type",
+    [
+        "application/pdf",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "image/svg+xml",
+    ],
+)
+@patch("crawler._CLIENT.stream")
+def test_fetch_skips_non_html(mock_stream, content_type):
+    response = make_response(chunks=[b"data"], headers={"content-type": content_type})
+    mock_stream.return_value.__enter__.return_value = response
+
+    status, content, encoding = crawler.fetch("https://example.com/file")
+    assert status == crawler.SKIPPED_STATUS
+    assert content == b""
+    response.iter_bytes.assert_not_called()
+
+
+@patch("crawler._CLIENT.stream")
+def test_fetch_exception(mock_stream):
+    mock_stream.side_effect = Exception("Network error")
+
+    status, content, encoding = crawler.fetch("https://example.com")
+    assert status == crawler.FAILED_STATUS
+    assert content == b""
+    assert encoding is None
+
+
+@patch("crawler.time.sleep")
+@patch("crawler.time.monotonic", return_value=100.0)
+@patch("crawler.read_robots_txt", return_value=(2, None, None, True))
+@patch("crawler._CLIENT.stream")
+def test_fetch_spaces_requests_per_host(
+    mock_stream, mock_read_robots_txt, mock_monotonic, mock_sleep
+):
+    mock_stream.return_value.__enter__.return_value = make_response(404)
+
+    crawler.fetch("https://a.com/1")
+    crawler.fetch("https://a.com/2")
+    crawler.fetch("https://b.com/1")
+
+    # Only the second request to a.com has to wait
+    mock_sleep.assert_called_once_with(2.0)
+    assert crawler._HOST_NEXT_ALLOWED == {"a.com": 104.0, "b.com": 102.0}
+
+
+def test_fetch_async_success():
+    mock_client = MagicMock()
+    mock_client.stream.return_value.__aenter__.return_value = make_response(
+        chunks=[b"con", b"tent"]
+    )
+
+    status, content, encoding = asyncio.run(
+        crawler.fetch_async(mock_client, "https://example.com")
+    )
+    assert status == crawler.GOOD_STATUS
+    assert content == b"content"
+    assert encoding == "utf-8"
+
+
+@patch("crawler.get_robots_parser")
+def test_filter_allowed_jobs(mock_get_robots_parser):
+    rules = "User-agent: *\nDisallow: /private\nCrawl-delay: 3"
+    mock_get_robots_parser.side_effect = lambda scheme, netloc: (
+        Protego.parse(rules) if netloc == "example.com" else None
+    )
+
+    allowed = asyncio.run(
+        crawler.filter_allowed_jobs(
+            [
+                "https://example.com/public",
+                "https://example.com/private/page",
+                "https://example.com/other",
+                "https://other.com/private",
+            ]
+        )
+    )
+
+    assert allowed == [
+        ("https://example.com/public", 3),
+        ("https://example.com/other", 3),
+        ("https://other.com/private", None),
+    ]
+    # One robots.txt lookup per host, not per URL
+    assert mock_get_robots_parser.call_count == 2
+
+
+@patch("crawler._CLIENT.get")
+def test_filter_allowed_jobs_drops_malformed_urls(mock_get):
+    mock_get.side_effect = lambda url: (
+        MagicMock(status_code=404)
+        if url == "https://example.com/robots.txt"
+        else httpx.InvalidURL("bad host")
+    )
+
+    allowed = asyncio.run(
+        crawler.filter_allowed_jobs(
+            [
+                "http://[::1",
+                "http://example.com:port/",
+                "https://example.com/page",
+                "https://bad.example/page",
+            ]
+        )
+    )
+
+    # Only the job whose robots.txt lookup succeeded is kept
+    assert allowed == [("https://example.com/page", None)]
+
+
+@patch("crawler.asyncio.sleep", new_callable=AsyncMock)
+@patch("crawler.time.monotonic", return_value=100.0)
+def test_wait_for_host_spaces_requests_per_host(mock_monotonic, mock_sleep):
+    host_next_allowed = {}
+
+    async def schedule():
+        await crawler.wait_for_host(host_next_allowed, "a.com", 2)
+        await crawler.wait_for_host(host_next_allowed, "a.com", 2)
+        await crawler.wait_for_host(host_next_allowed, "b.com", 2)
+
+    asyncio.run(schedule())
+
+    # Only the second request to a.com has to wait
+    mock_sleep.assert_awaited_once_with(2.0)
+    assert host_next_allowed == {"a.com": 104.0, "b.com": 102.0}
+
+
+@patch("crawler.get_robots_parser", return_value=None)
+@patch("crawler.fetch_async", new_callable=AsyncMock)
+def test_crawl_jobs(mock_fetch, mock_get_robots_parser):
+    # Mock fetch to return success and some HTML content
+    html = """
+    <html><head><title>Page</title></head>
+    <body><a href="/child1">Child1</a></body></html>
+    """
+
+    mock_fetch.return_value = (crawler.GOOD_STATUS, html.encode(), "utf-8")
+
+    jobs = ["https://example.com"]
+    children, crawled = crawler.crawl_jobs(jobs)
+
+    assert len(crawled) == 1
+    assert crawled[0]["url"] == jobs[0]
+    assert crawled[0]["status"] == crawler.GOOD_STATUS
+    assert "https://example.com/child1" in crawled[0]["children"]
+    assert "https://example.com/child1" in children
+
+
+def make_crawl_job(site, delays=None):
+    # Stand-in for crawler.crawl_job serving pages from a {url: children} map,
+    # optionally taking {url: seconds} to answer for each page
+    async def crawl_job(
+        client, url, crawl_delay, semaphore, host_next_allowed, include_content=True
+    ):
+        await asyncio.sleep((delays or {}).get(url, 0))
+
+        if url not in site:
+            return None
+
+        return {
+            "url": url,
+            "title": "Title",
+            "status": crawler.GOOD_STATUS,
+            "content": "text",
+            "children": site[url],
+        }
+
+    return crawl_job
+
+
+@patch("crawler.get_robots_parser", return_value=None)
+@patch("crawler.crawl_job")
+@patch("crawler.validate_url")
+def test_crawl_target(mock_validate_url, mock_crawl_job, mock_get_robots_parser):
+    parent_url = "https://example.com"
+    mock_validate_url.return_value = True
+
+    # child1 is discovered but fails to fetch
+    mock_crawl_job.side_effect = make_crawl_job(
+        {parent_url: ["https://example.com/child1"]}
+    )
+
+    result = crawler.crawl_target(parent_url, recursive_depth=2)
+
+    assert result is not None
+    assert "crawl_result" in result
+    assert "child_links" in result
+    assert len(result["crawl_result"]) == 1
+    assert "https://example.com/child1" in result["child_links"]
+
+
+@patch("crawler.get_robots_parser", return_value=None)
+@patch("crawler.crawl_job")
+@patch("crawler.validate_url")
+def test_crawl_target_skips_visited(
+    mock_validate_url, mock_crawl_job, mock_get_robots_parser
+):
+    parent_url = "https://example.com"
+    mock_validate_url.return_value = True
+
+    mock_crawl_job.side_effect = make_crawl_job(
+        {
+            parent_url: [
+                "https://example.com/a",
+                "https://example.com/a/",
+                "https://example.com/b",
+            ],
+            "https://example.com/a": [
+                "https://example.com/",
+                "https://example.com/a",
+                "https://example.com/b#top",
+                "https://example.com/c",
+            ],
+            "https://example.com/b": [],
+            "https://example.com/c": ["https://example.com/d"],
+        }
+    )
+
+    with patch(
+        "crawler.canonicalize_url", wraps=crawler.canonicalize_url
+    ) as mock_canonicalize:
+        result = crawler.crawl_target(parent_url, recursive_depth=3)
+
+    crawled_urls = [call.args[1] for call in mock_crawl_job.call_args_list]
+    assert sorted(crawled_urls) == [
+        parent_url,
+        "https://example.com/a",
+        "https://example.com/b",
+        "https://example.com/c",
+    ]
+    # d is found at the depth limit, so it is listed but not fetched
+    assert result["child_links"] == [
+        "https://example.com/a",
+        "https://example.com/b",
+        "https://example.com/c",
+        "https://example.com/d",
+    ]
+    # The parent plus each distinct link string is canonicalized only once
+    assert mock_canonicalize.call_count == 8
+
+
+@pytest.mark.parametrize(
+    "recursive_depth,deepest_crawled",
+    [
+        # x is first found through b and c at the depth limit, then through
+        # the slow page a one level up, so it still has to be fetched
+        (3, ["https://example.com/x"]),
+        # x is fetched through c first, and its link to y only comes within
+        # reach once a shows x is a level shallower
+        (4, ["https://example.com/x", "https://example.com/y"]),
+    ],
+)
+@patch("crawler.get_robots_parser", return_value=None)
+@patch("crawler.crawl_job")
+@patch("crawler.validate_url")
+def test_crawl_target_fetches_pages_reached_late_by_shorter_path(
+    mock_validate_url,
+    mock_crawl_job,
+    mock_get_robots_parser,
+    recursive_depth,
+    deepest_crawled,
+):
+    parent_url = "https://example.com"
+    mock_validate_url.return_value = True
+
+    mock_crawl_job.side_effect = make_crawl_job(
+        {
+            parent_url: ["https://example.com/a", "https://example.com/b"],
+            "https://example.com/a": ["https://example.com/x"],
+            "https://example.com/b": ["https://example.com/c"],
+            "https://example.com/c": ["https://example.com/x"],
+            "https://example.com/x": ["https://example.com/y"],
+        },
+        delays={"https://example.com/a": 0.05},
+    )
+
+    result = crawler.crawl_target(parent_url, recursive_depth=recursive_depth)
+
+    crawled_urls = [call.args[1] for call in mock_crawl_job.call_args_list]
+    assert sorted(crawled_urls) == [
+        parent_url,
+        "https://example.com/a",
+        "https://example.com/b",
+        "https://example.com/c",
+        *deepest_crawled,
+    ]
+    assert sorted(result["child_links"]) == [
+        "https://example.com/a",
+        "https://example.com/b",
+        "https://example.com/c",
+        "https://example.com/x",
+        "https://example.com/y",
+    ]
+
+
+@patch("crawler.validate_url")
+def test_crawl_target_invalid_url(mock_validate_url):
+    mock_validate_url.return_value = False
+    result = crawler.crawl_target("invalid-url")
+    assert result is None
@@ -0,0 +1,631 @@
+import asyncio
+import atexit
+import codecs
+import httpx
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlsplit, urlunparse
+from protego import Protego
+from selectolax.lexbor import LexborHTMLParser
+
+GOOD_STATUS = "success"
+FAILED_STATUS = "failed"
+SKIPPED_STATUS = "skipped"
+
+HTML_MEDIA_TYPES = {"text/html", "application/xhtml+xml"}
+
+MAX_CONCURRENT_FETCHES = 10
+MAX_PAGE_SIZE = 5 * 1024 * 1024  # bytes, larger pages are abandoned
+ASYNC_CLIENT_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+
+# Shared by every blocking fetch so TCP/TLS connections are pooled and reused
+# across pages (and multiplexed over HTTP/2 where the host supports it).
+# With brotli installed httpx also advertises br alongside gzip and decodes
+# compressed bodies transparently.
+_CLIENT = httpx.Client(
+    http2=True,
+    timeout=10,
+    follow_redirects=True,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+)
+atexit.register(_CLIENT.close)
+
+# Earliest time.monotonic() each host may be fetched again by fetch, shared
+# by every thread crawling with the blocking client
+_HOST_NEXT_ALLOWED = {}
+_HOST_LOCK = threading.Lock()
+
+# scheme://host followed by an optional path, query or fragment, matched with
+# fullmatch since $ would also accept a trailing newline
+URL_PATTERN = re.compile(r"[a-z][a-z0-9+\-.]*://[^\s/?#]+(?:[/?#]\S*)?", re.IGNORECASE)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Links to these are never pages, so they are not worth a request
+NON_HTML_SUFFIXES = (
+    ".pdf",
+    ".doc",
+    ".docx",
+    ".xls",
+    ".xlsx",
+    ".ppt",
+    ".pptx",
+    ".jpg",
+    ".jpeg",
+    ".png",
+    ".gif",
+    ".svg",
+    ".zip",
+    ".mp3",
+    ".mp4",
+    ".css",
+    ".js",
+)
+
+# Elements whose text is code rather than page content
+NON_CONTENT_TAGS = ["script", "style"]
+
+ROBOTS_CACHE_SIZE = 256
+ROBOTS_CACHE_TTL = 6 * 60 * 60  # seconds before robots.txt is fetched again
+ROBOTS_MAX_SIZE = 500 * 1024  # Google ignores anything past 500 KiB
+
+# (scheme, netloc, user_agent) -> (rules, fetched_at), least recently used first
+_ROBOTS_CACHE = OrderedDict()
+_ROBOTS_LOCK = threading.Lock()
+
+
+def get_robots_parser(scheme: str, netloc: str):
+    robots_url = urlunparse((scheme, netloc, "/robots.txt", "", "", ""))
+
+    response = _CLIENT.get(robots_url)
+
+    # A 4xx means the site has no robots.txt, so there are no rules to follow.
+    # Network errors and 5xx are raised instead, which keeps them out of the
+    # cache so the next page on the host tries again.
+    if httpx.codes.is_client_error(response.status_code):
+        return None
+
+    response.raise_for_status()
+
+    return Protego.parse(response.text[:ROBOTS_MAX_SIZE])
+
+
+def load_robots_rules(scheme: str, netloc: str, user_agent: str):
+    # Everything except can_fetch depends only on the host and user agent,
+    # so it is worked out once and reused for every URL on the host
+    rp = get_robots_parser(scheme, netloc)
+
+    if rp is None:
+        return (None, None, None, None)
+
+    crawl_delay = rp.crawl_delay(user_agent)
+    request_rate = rp.request_rate(user_agent)
+    preferred_host = rp.preferred_host
+
+    if request_rate:
+        request_rate = (request_rate.requests, request_rate.seconds)
+
+    return (rp, crawl_delay, request_rate, preferred_host)
+
+
+def get_robots_rules(scheme: str, netloc: str, user_agent: str = "*"):
+    key = (scheme, netloc, user_agent)
+
+    # Each host's rules are reused until ROBOTS_CACHE_TTL has passed since
+    # its own robots.txt was fetched
+    with _ROBOTS_LOCK:
+        cached = _ROBOTS_CACHE.get(key)
+        if cached is not None and time.time() - cached[1] < ROBOTS_CACHE_TTL:
+            _ROBOTS_CACHE.move_to_end(key)
+            return cached[0]
+
+    # Fetched outside the lock so a slow host doesn't hold up the others
+    try:
+        rules = load_robots_rules(scheme, netloc, user_agent)
+    except httpx.HTTPError:
+        # robots.txt is unavailable right now, crawl as if there were no rules
+        return (None, None, None, None)
+
+    with _ROBOTS_LOCK:
+        _ROBOTS_CACHE[key] = (rules, time.time())
+        _ROBOTS_CACHE.move_to_end(key)
+        if len(_ROBOTS_CACHE) > ROBOTS_CACHE_SIZE:
+            _ROBOTS_CACHE.popitem(last=False)
+
+    return rules
+
+
+def read_robots_txt(url: str, user_agent: str = "*"):
+    parsed = urlparse(url)
+    scheme = parsed.scheme or "http"
+    netloc = parsed.netloc or parsed.path  # handles URLs like 'example.com'
+
+    rp, crawl_delay, request_rate, preferred_host = get_robots_rules(
+        scheme, netloc, user_agent
+    )
+
+    if rp is None:
+        return (None, None, None, None)
+
+    is_allowed = rp.can_fetch(url, user_agent)
+
+    return (crawl_delay, request_rate, preferred_host, is_allowed)
+
+
+def canonicalize_url(url: str):
+    parsed = urlparse(url)
+
+    # Collapse trivially different spellings of the same page: drop the
+    # fragment, lowercase scheme and host, ignore a trailing slash and the
+    # order of query parameters.
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+
+    return urlunparse(
+        (
+            parsed.scheme.lower(),
+            parsed.netloc.lower(),
+            parsed.path.rstrip("/"),
+            parsed.params,
+            query,
+            "",
+        )
+    )
+
+
+class ParentKey(NamedTuple):
+    scheme: str
+    netloc: str
+    origin: str  # scheme://netloc, for resolving root-relative links
+    path: str  # trailing slash stripped
+    path_prefix: str  # path + "/"
+
+
+def get_parent_key(parent_url: str):
+    # Everything the sub path checks derive from the parent, built once per
+    # get_children call and passed to the check for every link on the page
+    parsed_parent = urlsplit(parent_url)
+    path = parsed_parent.path.rstrip("/")
+
+    return ParentKey(
+        parsed_parent.scheme,
+        parsed_parent.netloc,
+        f"{parsed_parent.scheme}://{parsed_parent.netloc}",
+        path,
+        path + "/",
+    )
+
+
+def _is_sub_path_fast(link, parent_key):
+    # The one rule for which absolute links count as children of a parent,
+    # shared by get_children and is_sub_path
+    try:
+        parsed_link = urlsplit(link)
+    except ValueError:
+        return False
+
+    if parsed_link.netloc != parent_key.netloc:
+        return False
+
+    link_path = parsed_link.path.rstrip("/")
+    if link_path.lower().endswith(NON_HTML_SUFFIXES):
+        return False
+
+    return link_path == parent_key.path or link_path.startswith(parent_key.path_prefix)
+
+
+def is_sub_path(link, parent_url):
+    return _is_sub_path_fast(link, get_parent_key(parent_url))
+
+
+def get_children(hrefs, parent_url):
+    parent_key = get_parent_key(parent_url)
+
+    # Resolve, filter and dedupe each href in one pass. The dict keeps the
+    # first occurrence of each link in page order.
+    valid_children = {}
+    for link in hrefs:
+        if not link:
+            continue
+
+        if link.startswith("//"):
+            link = f"{parent_key.scheme}:{link}"
+        elif link.startswith("/"):
+            link = parent_key.origin + link
+
+        if _is_sub_path_fast(link, parent_key):
+            valid_children[link] = None
+
+    return list(valid_children)
+
+
+def parse_result(
+    result, parent_url: str, encoding: str = None, include_content: bool = True
+):
+
+    # Lexbor reads bytes as UTF-8, so only other charsets need decoding here
+    if isinstance(result, bytes) and encoding:
+        if codecs.lookup(encoding).name != "utf-8":
+            result = result.decode(encoding, errors="replace")
+
+    tree = LexborHTMLParser(result)
+
+    # Title and links come out of a single selector match over the tree
+    title = None
+    hrefs = []
+    for node in tree.css("title, a[href]"):
+        if node.tag == "a":
+            hrefs.append(node.attributes.get("href"))
+        elif title is None:
+            title = node.text()
+
+    child_links = get_children(hrefs, parent_url)
+
+    # Extracting the text walks every node of the page, skip it when the
+    # caller only wants titles and links
+    content = None
+    if include_content:
+        tree.strip_tags(NON_CONTENT_TAGS)
+        text = tree.body.text(separator=" ") if tree.body else ""
+        content = WHITESPACE_PATTERN.sub(" ", text).strip()
+
+    return title, child_links, content
+
+
+def validate_url(url: str):
+    if not url or URL_PATTERN.fullmatch(url) is None:
+        return False
+
+    # The pattern doesn't look inside the host, so also reject what urlsplit
+    # can't parse, such as a bad IPv6 literal or a non-numeric port
+    try:
+        urlsplit(url).port
+    except ValueError:
+        return False
+
+    return True
+
+
+def is_html(response):
+    # Servers that send no Content-Type get the benefit of the doubt
+    content_type = response.headers.get("content-type", "text/html").lower()
+    media_type = content_type.split(";")[0].strip()
+
+    return media_type in HTML_MEDIA_TYPES
+
+
+def check_page_size(response, received: int = 0):
+    # Give up on a page as soon as its headers or the bytes read so far show
+    # it is over MAX_PAGE_SIZE, rather than after downloading all of it
+    declared = response.headers.get("content-length", "")
+
+    if received > MAX_PAGE_SIZE or (
+        declared.isdigit() and int(declared) > MAX_PAGE_SIZE
+    ):
+        raise ValueError(f"Page larger than {MAX_PAGE_SIZE} bytes")
+
+
+def fetch(url: str):
+    status = FAILED_STATUS
+    content = b""
+    encoding = None
+
+    try:
+
+        crawl_delay, request_rate, preferred_host, is_allowed = read_robots_txt(url)
+
+        if is_allowed is False:
+            return status, content, encoding
+
+        # Only the slot reservation is locked, the wait happens outside it so
+        # threads fetching other hosts are never held up
+        if crawl_delay:
+            with _HOST_LOCK:
+                wait = reserve_host_slot(
+                    _HOST_NEXT_ALLOWED, urlsplit(url).netloc, crawl_delay
+                )
+
+            if wait > 0:
+                time.sleep(wait)
+
+        with _CLIENT.stream("GET", url) as r:
+            if r.status_code == httpx.codes.OK:
+                # Decided from the headers alone, the body is never downloaded
+                if not is_html(r):
+                    return SKIPPED_STATUS, content, encoding
+
+                check_page_size(r)
+
+                body = bytearray()
+                for chunk in r.iter_bytes():
+                    body += chunk
+                    check_page_size(r, len(body))
+
+                status = GOOD_STATUS
+                content = bytes(body)
+                encoding = r.encoding
+    except Exception as e:
+        print(f"Request Failed {e}")
+
+    return status, content, encoding
+
+
+async def fetch_async(client: httpx.AsyncClient, url: str):
+    status = FAILED_STATUS
+    content = b""
+    encoding = None
+
+    try:
+
+        async with client.stream("GET", url) as r:
+            if r.status_code == httpx.codes.OK:
+                # Decided from the headers alone, the body is never downloaded
+                if not is_html(r):
+                    return SKIPPED_STATUS, content, encoding
+
+                check_page_size(r)
+
+                body = bytearray()
+                async for chunk in r.aiter_bytes():
+                    body += chunk
+                    check_page_size(r, len(body))
+
+                status = GOOD_STATUS
+                content = bytes(body)
+                encoding = r.encoding
+    except Exception as e:
+        print(f"Request Failed {e}")
+
+    return status, content, encoding
+
+
+def reserve_host_slot(host_next_allowed: dict, host: str, crawl_delay: float):
+    # Reserve the host's next slot before waiting, so requests for the same
+    # host queue up crawl_delay apart while other hosts carry on. Returns how
+    # long the caller has to wait for its slot.
+    now = time.monotonic()
+    start = max(now, host_next_allowed.get(host, now))
+    host_next_allowed[host] = start + crawl_delay
+
+    return start - now
+
+
+async def wait_for_host(host_next_allowed: dict, host: str, crawl_delay: float):
+    wait = reserve_host_slot(host_next_allowed, host, crawl_delay)
+
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+async def filter_allowed_jobs(jobs: list, user_agent: str = "*"):
+    # A malformed URL only fails its own job, not the whole batch
+    parsed_jobs = []
+    for url in jobs:
+        try:
+            parsed = urlsplit(url)
+            parsed.port  # raises for a port that isn't a number
+        except ValueError as e:
+            print(f"Request Failed {e}")
+            continue
+
+        parsed_jobs.append((url, (parsed.scheme or "http", parsed.netloc)))
+
+    hosts = list(dict.fromkeys(host for _, host in parsed_jobs))
+
+    # robots.txt is looked up once per host (and served from the cache after
+    # that) rather than once per URL
+    rules = await asyncio.gather(
+        *(asyncio.to_thread(get_robots_rules, *host, user_agent) for host in hosts),
+        return_exceptions=True,
+    )
+    robots = dict(zip(hosts, rules))
+
+    allowed_jobs = []
+    for url, host in parsed_jobs:
+        if isinstance(robots[host], Exception):
+            print(f"Request Failed {robots[host]}")
+            continue
+
+        rp, crawl_delay, _, _ = robots[host]
+
+        if rp is None or rp.can_fetch(url, user_agent):
+            allowed_jobs.append((url, crawl_delay))
+
+    return allowed_jobs
+
+
+def open_async_client():
+    return httpx.AsyncClient(
+        http2=True, timeout=10, follow_redirects=True, limits=ASYNC_CLIENT_LIMITS
+    )
+
+
+async def crawl_job(
+    client, url, crawl_delay, semaphore, host_next_allowed, include_content=True
+):
+    # Wait out the crawl delay before taking a fetch slot
+    if crawl_delay:
+        await wait_for_host(host_next_allowed, urlsplit(url).netloc, crawl_delay)
+
+    async with semaphore:
+        status, html_content, encoding = await fetch_async(client, url)
+
+    if status is not GOOD_STATUS:
+        return None
+
+    # Parsing is CPU-bound, keep it off the event loop so it overlaps
+    # with the fetches still in flight.
+    title, child_links, content = await asyncio.get_running_loop().run_in_executor(
+        None, parse_result, html_content, url, encoding, include_content
+    )
+
+    return {
+        "url": url,
+        "title": title,
+        "status": status,
+        "content": content,
+        "children": child_links,
+    }
+
+
+async def crawl_jobs_async(jobs: list, include_content: bool = True):
+    crawled = []
+    all_child_links = []
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    host_next_allowed = {}
+
+    # Disallowed URLs are dropped before they can take a fetch slot
+    allowed_jobs = await filter_allowed_jobs(jobs)
+
+    async with open_async_client() as client:
+        results = await asyncio.gather(
+            *(
+                crawl_job(
+                    client,
+                    url,
+                    delay,
+                    semaphore,
+                    host_next_allowed,
+                    include_content=include_content,
+                )
+                for url, delay in allowed_jobs
+            )
+        )
+
+    for crawl_result in results:
+        if crawl_result is not None:
+            crawled.append(crawl_result)
+            all_child_links.extend(crawl_result["children"])
+
+    return all_child_links, crawled
+
+
+def crawl_jobs(jobs: list, include_content: bool = True):
+    return asyncio.run(crawl_jobs_async(jobs, include_content))
+
+
+async def crawl_target_async(
+    parent_url: str, recursive_depth: int = 2, include_content: bool = True
+):
+    crawl_result = []
+    all_descendant_links = []
+
+    # Canonical form of each raw link string seen so far; most pages repeat
+    # the same navigation links, so each string is canonicalized only once
+    canonical_keys = {parent_url: canonicalize_url(parent_url)}
+    root_key = canonical_keys[parent_url]
+
+    # listed holds every page already in child_links. best_depth holds the
+    # shallowest depth each scheduled page has been found at, and
+    # fetched_children the links of the pages already crawled.
+    listed = {root_key}
+    best_depth = {root_key: 0}
+    fetched_children = {}
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    host_next_allowed = {}
+
+    async with open_async_client() as client:
+
+        async def crawl_page(url, key):
+            allowed_jobs = await filter_allowed_jobs([url])
+
+            if not allowed_jobs:
+                return key, None
+
+            crawl_delay = allowed_jobs[0][1]
+            page = await crawl_job(
+                client,
+                url,
+                crawl_delay,
+                semaphore,
+                host_next_allowed,
+                include_content=include_content,
+            )
+
+            return key, page
+
+        def add_children(children, depth):
+            # Tasks finish in any order, so a page may be found again by a
+            # shorter path after it was scheduled. It keeps the shallowest
+            # depth, and if it has already been crawled its own links are
+            # passed through again at that depth, so the pages fetched match
+            # a level-by-level crawl whatever order the fetches finish in.
+            child_depth = depth + 1
+
+            for link in children:
+                key = canonical_keys.get(link)
+                if key is None:
+                    key = canonical_keys[link] = canonicalize_url(link)
+
+                if key not in listed:
+                    listed.add(key)
+                    all_descendant_links.append(link)
+
+                if child_depth >= recursive_depth:
+                    continue
+
+                previous_depth = best_depth.get(key)
+                if previous_depth is not None and previous_depth <= child_depth:
+                    continue
+                best_depth[key] = child_depth
+
+                if previous_depth is None:
+                    pending.add(asyncio.ensure_future(crawl_page(link, key)))
+                elif key in fetched_children:
+                    add_children(fetched_children[key], child_depth)
+                # A page still in flight picks up its new depth when it lands
+
+        # Each page is its own task and its children are scheduled as soon as
+        # it has been parsed, so deeper pages start while shallower ones are
+        # still in flight instead of waiting for a whole generation to finish.
+        # The semaphore hands out fetch slots in scheduling order, which keeps
+        # the crawl roughly breadth first.
+        pending = set()
+        if recursive_depth > 0:
+            pending.add(asyncio.ensure_future(crawl_page(parent_url, root_key)))
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for task in done:
+                key, page = task.result()
+
+                if page is None:
+                    continue
+
+                crawl_result.append(page)
+                fetched_children[key] = page["children"]
+                add_children(page["children"], best_depth[key])
+
+    result = {
+        "crawl_result": crawl_result,
+        "child_links": all_descendant_links,
+    }
+
+    return result
+
+
+def crawl_target(
+    parent_url: str, recursive_depth: int = 2, include_content: bool = True
+):
+
+    valid_url = validate_url(parent_url)
+
+    if not valid_url:
+        return None
+
+    return asyncio.run(crawl_target_async(parent_url, recursive_depth, include_content))
+
+
+if __name__ == "__main__":
+    target = "https://www.cmu.edu/cmufront/"
+
+    result = crawl_target(target)
+    print(result)
+    # print(len(result["crawl_result"]))